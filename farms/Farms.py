@@ -11,8 +11,9 @@ farms = {
 
 class Farm:
     DEFAULT_POWER_PRICE = 0.15
-    def __init__(self, idb, customer):
-        self.idb = idb
+    def __init__(self, sink, tagger, customer):
+        self.sink = sink
+        self.tagger = tagger
         self.customer = customer
         self.points = []
         self.workers = []
@@ -26,8 +27,8 @@ class Farm:
 
 
 class HiveOs(Farm):
-    def __init__(self, idb, customer, token):
-        super().__init__(idb, customer)
+    def __init__(self, sink, tagger, customer, token):
+        super().__init__(sink, tagger, customer)
         self.token = token
         self.url = None
         self.farms = {}
@@ -141,7 +142,7 @@ class HiveOs(Farm):
             }
         })
         self.enrich_points()
-        self.idb.write_points(self.points, time_precision='h', retention_policy='autogen')
+        self.sink.write_points(self.points, time_precision='h', retention_policy='autogen')
 
     def enrich_points(self):
         tags = {
@@ -152,6 +153,7 @@ class HiveOs(Farm):
                 point["tags"].update(tags)
             except KeyError:
                 point["tags"] = tags
+        self.points = self.tagger.apply(self.customer, self.points)
 
     def query(self, uri):
         try:
@@ -194,8 +196,8 @@ class HiveOs(Farm):
 
 
 class StaticWorkers(Farm):
-    def __init__(self, idb, customer, config, workers):
-        super().__init__(idb, customer)
+    def __init__(self, sink, tagger, customer, config, workers):
+        super().__init__(sink, tagger, customer)
         self.config = config
         self.pool_workers = workers
 
@@ -210,13 +212,11 @@ class StaticWorkers(Farm):
                 gpus = self.config[worker]['gpus']
             except KeyError: pass
 
-            # On Ethermine, worker name is lowered:
-            for w in (worker, worker.lower()):
-                try:
-                    hashrate = self.pool_workers[w]
-                    logging.warning("Found %s for %s", hashrate, w)
-                    break
-                except KeyError: pass
+            # Pool workers are keyed by normalized name (Ethermine lowers them):
+            try:
+                hashrate = self.pool_workers[self.tagger.normalize(worker)]
+                logging.warning("Found %s for %s", hashrate, worker)
+            except KeyError: pass
 
             if not hashrate:
                 try:
@@ -271,5 +271,6 @@ class StaticWorkers(Farm):
                 "total_power_costs": self.total_power_costs
             }
         })
-        self.idb.write_points(self.points, time_precision='h', retention_policy='autogen')
+        self.points = self.tagger.apply(self.customer, self.points)
+        self.sink.write_points(self.points, time_precision='h', retention_policy='autogen')
 
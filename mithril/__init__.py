@@ -3,7 +3,6 @@
 __version__ = '0.1.0'
 
 import tqdm
-import influxdb
 import argparse
 import logging
 import logging.config
@@ -16,6 +15,8 @@ import threading
 import yaml
 from pool import Pools
 from farms import Farms
+from sinks import Sinks
+from tags import Tags
 
 
 class ColoredFormatter(logging.Formatter):  # {{{
@@ -65,24 +66,25 @@ class Fetch:
     def __init__(self, config):
         logging.info("🦄 Starting ...")
         self.miners = config['miners']
-        self.idb = influxdb.InfluxDBClient(
-            host=config['general']["idb"]["host"],
-            port=config['general']["idb"]["port"],
-            database=config['general']["idb"]["database"],
-            gzip=False,
-            timeout=600)
+        sinks = [Sinks.InfluxDB(config['general']["idb"])]
+        if 'archive' in config['general']:
+            sinks.append(Sinks.SQLite(config['general']["archive"]))
+        self.sink = Sinks.Multi(sinks)
+        self.tagger = Tags.Tagger(config['general'].get('series', {}), self.sink)
 
     def fetchall(self):
         for customer in self.miners:
             logging.info("🧢 Fetching %s ...", customer)
             self.fetch(customer, self.miners[customer])
+        self.tagger.report()
+        self.sink.close()
 
     def fetch(self, customer, config):
         workers = {}
         prices = {}
         for poolname in config['pools']:
             poolclass = getattr(Pools, config['pools'][poolname]['pool'].capitalize())
-            pool = poolclass(self.idb, config['pools'][poolname]['pool'], customer, config['pools'][poolname]['wallet'], config['pools'][poolname]['coin'])
+            pool = poolclass(self.sink, self.tagger, config['pools'][poolname]['pool'], customer, config['pools'][poolname]['wallet'], config['pools'][poolname]['coin'])
             pool.fetch_globals()
 
             # Share prices between nanopool and :
@@ -96,10 +98,10 @@ class Fetch:
             workers.update(pool.workers)
         if 'hiveos' in config:
             for token in config['hiveos']:
-                hiveos = Farms.HiveOs(self.idb, customer, token)
+                hiveos = Farms.HiveOs(self.sink, self.tagger, customer, token)
                 hiveos.fetch()
         if 'workers' in config:
-            static_workers = Farms.StaticWorkers(self.idb, customer, config['workers'], workers)
+            static_workers = Farms.StaticWorkers(self.sink, self.tagger, customer, config['workers'], workers)
             static_workers.fetch()
 
 
@@ -10,8 +10,9 @@ pools = {
 }
 
 class Pool:
-    def __init__(self, idb, pool, customer, wallet, coin):
-        self.idb = idb
+    def __init__(self, sink, tagger, pool, customer, wallet, coin):
+        self.sink = sink
+        self.tagger = tagger
         self.pool = pool
         self.customer = customer
         self.wallet = wallet
@@ -23,16 +24,18 @@ class Pool:
         self.workers = {}
         self.prices = {}
         self.payments_data = []
+        self.data = {}
 
     def fetch(self):
-        self.idb.write_points(self.global_points, time_precision='h', retention_policy='autogen')
+        self.sink.write_points(self.global_points, time_precision='h', retention_policy='autogen')
         self.payments()
+        self.load()
         self.account()
         self.hashrate()
         self.earnings()
         self.pool_effiency()
         self.enrich_points()
-        self.idb.write_points(self.points, time_precision='h', retention_policy='autogen')
+        self.sink.write_points(self.points, time_precision='h', retention_policy='autogen')
 
     def fetch_globals(self):
         pass
@@ -49,6 +52,7 @@ class Pool:
                 point["tags"].update(tags)
             except KeyError:
                 point["tags"] = tags
+        self.points = self.tagger.apply(self.customer, self.points)
 
     def total_payments(self):
         total_payments = sum(self.payments_data)
@@ -82,6 +86,9 @@ class Pool:
     def payments(self):
         pass
 
+    def load(self):
+        pass
+
     def account(self):
         pass
 
@@ -94,8 +101,8 @@ class Pool:
 
 
 class Nanopool(Pool):
-    def __init__(self, idb, pool, customer, wallet, coin):
-        super().__init__(idb, pool, customer, wallet, coin)
+    def __init__(self, sink, tagger, pool, customer, wallet, coin):
+        super().__init__(sink, tagger, pool, customer, wallet, coin)
         self.pool = "nanopool"
         self.set_url()
 
@@ -133,7 +140,7 @@ class Nanopool(Pool):
                 self.payments_data.append(p['amount'])
                 self.points.append({
                     "measurement": "payments",
-                    "time": datetime.datetime.fromtimestamp(p['date']),
+                    "time": datetime.datetime.fromtimestamp(p['date'], datetime.timezone.utc),
                     "fields": {
                         "amount": p['amount']
                     }
@@ -142,40 +149,81 @@ class Nanopool(Pool):
         self.total_payments()
 
 
+    # Keys /user can provide when load_account lacks them:
+    USER_KEYS = ("balance", "hashrate", "avg", "workers")
+
+    def load(self):
+        self.data = self.decode_account(self.json("/load_account/%s"%self.wallet))
+        missing = [k for k in self.USER_KEYS + ("payout", "reported") if k not in self.data]
+        if not missing:
+            return
+        logging.warning("Nanopool load_account lacks %s for %s, falling back to per-endpoint queries", ', '.join(missing), self.wallet)
+
+        if set(missing) & set(self.USER_KEYS):
+            # /user has the load_account userParams, avgHashrate and workers in one object:
+            ac = self.json("/user/%s"%self.wallet)
+            user = self.decode_account({"userParams": ac, "avgHashrate": ac['avgHashrate'], "workers": ac['workers']})
+            for k in self.USER_KEYS:
+                self.data.setdefault(k, user[k])
+        if "payout" in missing:
+            self.data['payout'] = float(self.json("/usersettings/%s"%self.wallet)['payout'])
+        if "reported" in missing:
+            self.data['reported'] = int(float(self.json("/reportedhashrate/%s"%self.wallet)))
+
+    def decode_account(self, data):
+        """
+        Decode a load_account response, keys it lacks are left out.
+        """
+        decoded = {}
+        try:
+            params = data['userParams']
+        except (KeyError, TypeError):
+            return decoded
+        decoders = {
+            "balance": lambda: float(params['balance']),
+            "payout": lambda: float(params['payout']),
+            "hashrate": lambda: int(float(params['hashrate'])),
+            "reported": lambda: int(float(params['reportedHashrate'])),
+            "avg": lambda: int(float(data['avgHashrate']['h1'])),
+            "workers": lambda: [(w['id'], int(float(w['hashrate'])), int(float(w['h1']))) for w in data['workers']],
+        }
+        for k in decoders:
+            try:
+                decoded[k] = decoders[k]()
+            except (KeyError, TypeError, ValueError):
+                pass
+        return decoded
+
     def account(self):
-        us = self.json("/usersettings/%s"%self.wallet)
-        ac = self.json("/user/%s"%self.wallet)
         self.points.append({
             "measurement": "account",
             "fields": {
-                'balance':		float(ac['balance']),
-                'payout':		float(us['payout']),
+                'balance':		self.data['balance'],
+                'payout':		self.data['payout'],
             }
         })
 
-        for w in ac['workers']:
-            self.workers[w['id']] = int(float(w['hashrate']))
+        for worker, hashrate, h1 in self.data['workers']:
+            self.workers[self.tagger.normalize(worker)] = hashrate
             self.points.append({
                 "measurement": "pool_workers",
-                "tags": {"worker": w['id']},
+                "tags": {"worker": worker},
                 "fields": {
-                    'hashrate':		int(float(w['hashrate'])),
-                    'avghashrate':	int(float(w['h1'])),
+                    'hashrate':		hashrate,
+                    'avghashrate':	h1,
                 }
             })
 
 
     
     def hashrate(self):
-        data = self.json("/reportedhashrate/%s"%self.wallet)
-        ac = self.json("/user/%s"%self.wallet)
-        self.hr = int(float(data))
+        self.hr = self.data['reported']
         self.points.append({
             "measurement": "hashrate",
             "fields": {
                 "reported":     self.hr,
-                'calculated':	int(float(ac['hashrate'])),
-                'avg':	        int(float(ac['avgHashrate']['h1'])),
+                'calculated':	self.data['hashrate'],
+                'avg':	        self.data['avg'],
             }
         })
     
@@ -199,8 +247,8 @@ class Nanopool(Pool):
 
 
 class Ethermine(Pool):
-    def __init__(self, idb, pool, customer, wallet, coin):
-        super().__init__(idb, pool, customer, wallet, coin)
+    def __init__(self, sink, tagger, pool, customer, wallet, coin):
+        super().__init__(sink, tagger, pool, customer, wallet, coin)
         self.pool = "ethermine"
         self.set_url()
 
@@ -236,25 +284,50 @@ class Ethermine(Pool):
         self.total_payments()
 
 
-    def account(self):
+    def load(self):
         self.stats = self.json("/miner/%s/currentStats"%self.wallet)
-        us = self.json("/miner/%s/settings"%self.wallet)
+        self.data = self.decode_dashboard(self.json("/miner/%s/dashboard"%self.wallet))
+        missing = [k for k in ("minPayout", "workers") if k not in self.data]
+        if not missing:
+            return
+        logging.warning("Ethermine dashboard lacks %s for %s, falling back to per-endpoint queries", ', '.join(missing), self.wallet)
+
+        if "minPayout" in missing:
+            self.data['minPayout'] = self.json("/miner/%s/settings"%self.wallet)['minPayout']
+        if "workers" in missing:
+            self.data['workers'] = self.json("/miner/%s/workers"%self.wallet)
+
+    def decode_dashboard(self, data):
+        """
+        Decode a dashboard response, keys it lacks are left out.
+        """
+        decoded = {}
+        try:
+            decoded['minPayout'] = data['settings']['minPayout']
+        except (KeyError, TypeError):
+            pass
+        try:
+            decoded['workers'] = list(data['workers'])
+        except (KeyError, TypeError):
+            pass
+        return decoded
+
+    def account(self):
         self.hr = int(self.stats['reportedHashrate']/1000000)
         self.points.append({
             "measurement": "account",
             "fields": {
                 'balance':		self.stats['unpaid']/1000000000000000000,
-                'payout':		us['minPayout']/1000000000000000000,
+                'payout':		self.data['minPayout']/1000000000000000000,
             }
         })
 
-        workers = self.json("/miner/%s/workers"%self.wallet)
-        for w in workers:
+        for w in self.data['workers']:
             # On ASICs, reportedHashrate is 0:
             if w['reportedHashrate'] == 0:
-                self.workers[w['worker']] = int(w['currentHashrate']/1000000)
+                self.workers[self.tagger.normalize(w['worker'])] = int(w['currentHashrate']/1000000)
             else:
-                self.workers[w['worker']] = int(w['reportedHashrate']/1000000)
+                self.workers[self.tagger.normalize(w['worker'])] = int(w['reportedHashrate']/1000000)
             self.points.append({
                 "measurement": "pool_workers",
                 "tags": {"worker": w['worker']},
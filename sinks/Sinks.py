@@ -0,0 +1,214 @@
+import logging
+import json
+import re
+import sqlite3
+import datetime
+import influxdb
+
+
+class Sink:
+    def __init__(self):
+        pass
+
+    def write_points(self, points, time_precision=None, retention_policy=None):
+        pass
+
+    def series(self, measurement, customer, days=None):
+        """
+        Tags of each series already stored for a customer, written within days if set.
+        """
+        return []
+
+    def cardinality(self, measurement):
+        return None
+
+    def close(self):
+        pass
+
+
+
+def parse_series(key):
+    """
+    'workers,customer=Groot,name=rig\\ 1' => {'customer': 'Groot', 'name': 'rig 1'}
+    """
+    unescape = lambda s: re.sub(r'\\(.)', r'\1', s)
+    tags = {}
+    for pair in re.split(r'(?<!\\),', key)[1:]:
+        k, v = re.split(r'(?<!\\)=', pair, 1)
+        tags[unescape(k)] = unescape(v)
+    return tags
+
+
+
+class InfluxDB(Sink):
+    def __init__(self, config):
+        super().__init__()
+        self.client = influxdb.InfluxDBClient(
+            host=config["host"],
+            port=config["port"],
+            database=config["database"],
+            gzip=False,
+            timeout=600)
+
+    def write_points(self, points, time_precision=None, retention_policy=None):
+        return self.client.write_points(points, time_precision=time_precision, retention_policy=retention_policy)
+
+    def quote(self, value):
+        return "'%s'" % value.replace("\\", "\\\\").replace("'", "\\'")
+
+    def series(self, measurement, customer, days=None):
+        # Metadata query, no point is read:
+        query = 'SHOW SERIES FROM "%s" WHERE "customer" = %s' % (measurement, self.quote(customer))
+        if days:
+            query += ' AND time > now() - %dd' % days
+        return [parse_series(p['key']) for p in self.client.query(query).get_points()]
+
+    def cardinality(self, measurement):
+        rs = self.client.query('SHOW SERIES EXACT CARDINALITY FROM "%s"' % measurement)
+        return sum(p['count'] for p in rs.get_points())
+
+    def close(self):
+        self.client.close()
+
+
+
+class SQLite(Sink):
+    """
+    Local archive: one table per measurement, one column per tag or field,
+    indexed by day and customer so long-range reports only scan what they need.
+    Like InfluxDB, a point with the same time and tags overwrites the previous one.
+    Times are stored in UTC in the _time and _day columns (naive datetimes are
+    UTC, as for InfluxDB), a field with the same name as a tag is stored as
+    <name>_1 as InfluxDB returns it. Column names are case insensitive.
+    """
+    MEASUREMENTS = ('workers', 'pool_workers', 'payments', 'earnings', 'customers')
+
+    def __init__(self, config):
+        super().__init__()
+        self.path = config['path']
+        self.measurements = config.get('measurements', self.MEASUREMENTS)
+        self.db = sqlite3.connect(self.path)
+        self.columns = {}
+        logging.debug("SQLite archive in %s for %s", self.path, ', '.join(self.measurements))
+
+    def table(self, measurement):
+        if measurement not in self.columns:
+            self.db.execute('CREATE TABLE IF NOT EXISTS "%s" (_key TEXT PRIMARY KEY, _time TEXT, _day TEXT, customer TEXT)' % measurement)
+            self.db.execute('CREATE INDEX IF NOT EXISTS "%s_day" ON "%s" (_day, customer)' % (measurement, measurement))
+            self.columns[measurement] = set(c[1].lower() for c in self.db.execute('PRAGMA table_info("%s")' % measurement))
+        return self.columns[measurement]
+
+    def add_columns(self, measurement, names):
+        columns = self.table(measurement)
+        for name in names:
+            if name.lower() not in columns:
+                self.db.execute('ALTER TABLE "%s" ADD COLUMN "%s"' % (measurement, name))
+                columns.add(name.lower())
+
+    def point_time(self, point, now):
+        try:
+            t = point['time']
+        except KeyError:
+            return now
+        if isinstance(t, datetime.datetime):
+            if t.tzinfo:
+                t = t.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            return t.isoformat()
+        return str(t)
+
+    def write_points(self, points, time_precision=None, retention_policy=None):
+        now = datetime.datetime.utcnow()
+        if time_precision == 'h':
+            now = now.replace(minute=0, second=0, microsecond=0)
+        now = now.isoformat()
+
+        count = 0
+        for point in points:
+            measurement = point['measurement']
+            if measurement not in self.measurements:
+                continue
+            tags = point.get('tags', {})
+            fields = point.get('fields', {})
+            t = self.point_time(point, now)
+
+            row = {
+                "_key": "%s|%s" % (t, json.dumps(tags, sort_keys=True)),
+                "_time": t,
+                "_day": t[:10],
+            }
+            lowered = set(name.lower() for name in tags)
+            columns = [(name, tags[name]) for name in tags]
+            columns += [(name + '_1' if name.lower() in lowered else name, fields[name]) for name in fields]
+            for name, value in columns:
+                if name.startswith('_'):
+                    raise ValueError("%s: '%s' is reserved for the archive" % (measurement, name))
+                if name.lower() in set(c.lower() for c in row):
+                    raise ValueError("%s: '%s' differs from another column only by case" % (measurement, name))
+                row[name] = value
+            self.add_columns(measurement, row.keys())
+
+            self.db.execute(
+                'INSERT OR REPLACE INTO "%s" (%s) VALUES (%s)' % (
+                    measurement,
+                    ', '.join('"%s"' % c for c in row),
+                    ', '.join('?' for c in row)),
+                list(row.values()))
+            count += 1
+        self.db.commit()
+        logging.debug("%d points archived in %s", count, self.path)
+        return True
+
+    def series(self, measurement, customer, days=None):
+        if measurement not in self.measurements:
+            return []
+        self.table(measurement)
+        # _key is "<time>|<tags>":
+        query = 'SELECT DISTINCT substr(_key, instr(_key, \'|\') + 1) FROM "%s" WHERE customer = ?' % measurement
+        args = [customer]
+        if days:
+            query += ' AND _time > ?'
+            args.append((datetime.datetime.utcnow() - datetime.timedelta(days=days)).isoformat())
+        return [json.loads(r[0]) for r in self.db.execute(query, args)]
+
+    def cardinality(self, measurement):
+        if measurement not in self.measurements:
+            return None
+        self.table(measurement)
+        # _key is "<time>|<tags>":
+        return self.db.execute('SELECT COUNT(DISTINCT substr(_key, instr(_key, \'|\') + 1)) FROM "%s"' % measurement).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+
+class Multi(Sink):
+    """
+    First sink is the primary store: its failures abort the run,
+    others are only logged.
+    """
+    def __init__(self, sinks):
+        super().__init__()
+        self.sinks = sinks
+
+    def write_points(self, points, time_precision=None, retention_policy=None):
+        primary = self.sinks[0]
+        primary.write_points(points, time_precision=time_precision, retention_policy=retention_policy)
+        for sink in self.sinks[1:]:
+            try:
+                sink.write_points(points, time_precision=time_precision, retention_policy=retention_policy)
+            except Exception:
+                logging.error("Unable to write %d points to %s", len(points), sink.__class__.__name__, exc_info=True)
+
+    def series(self, measurement, customer, days=None):
+        return self.sinks[0].series(measurement, customer, days)
+
+    def cardinality(self, measurement):
+        return self.sinks[0].cardinality(measurement)
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                logging.error("Unable to close %s", sink.__class__.__name__, exc_info=True)
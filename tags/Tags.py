@@ -0,0 +1,170 @@
+import logging
+import re
+
+# Measurements carrying a worker name in their tags:
+#  tag:    the worker tag to normalize and fold
+#  rank:   field used to pick which workers get a series when the budget is tight
+#  sum:    additive fields, summed when points are merged or folded into "other"
+#  ratios: fields recomputed from summed fields after a merge
+series = {
+    "workers": {
+        "tag": "name",
+        "rank": "hms",
+        "sum": ("gpus", "hms", "power"),
+        "ratios": {"efficiency": ("hms", "power", 1000)},
+    },
+    "pool_workers": {
+        "tag": "worker",
+        "rank": "avghashrate",
+        "sum": ("hashrate", "avghashrate"),
+        "ratios": {},
+    },
+}
+
+
+class Tagger:
+    DEFAULT_BUDGET = 0      # series per customer and measurement, 0 is unlimited
+    DEFAULT_OTHER = "other"
+    DEFAULT_STALE_DAYS = 30
+
+    def __init__(self, config, sink):
+        self.budget = config.get('budget', self.DEFAULT_BUDGET)
+        self.other = config.get('other', self.DEFAULT_OTHER)
+        # Stored series not written for this many days give their slot back:
+        self.stale_days = config.get('stale_days', self.DEFAULT_STALE_DAYS)
+        self.sink = sink
+        # (customer, measurement) => tag tuples of series stored within stale_days
+        self.stored = {}
+        # (customer, measurement) => "other" point, accumulated during the run
+        self.others = {}
+        # (customer, measurement) => tag tuples of worker series written during this run
+        self.written = {}
+        self.folded = {}
+
+    def normalize(self, name):
+        """
+        Only spelling variants converge: "Rig_01", "rig 01" and "RIG-01" are "rig-01",
+        "rig1-0" and "rig-10" stay apart.
+        """
+        return re.sub(r'[\W_]+', '-', str(name).casefold()).strip('-')
+
+    def key(self, measurement, tags):
+        tag = series[measurement]['tag']
+        return tuple(sorted((k, self.normalize(v) if k == tag else v) for k, v in tags.items()))
+
+    def load(self, customer, measurement):
+        if (customer, measurement) not in self.stored:
+            stored = set()
+            if self.budget:
+                tag = series[measurement]['tag']
+                for tags in self.sink.series(measurement, customer, self.stale_days):
+                    if tag in tags and self.normalize(tags[tag]) not in ('', self.other):
+                        stored.add(self.key(measurement, tags))
+                logging.debug("%s: %d %s series stored in the last %s days", customer, len(stored), measurement, self.stale_days)
+            self.stored[(customer, measurement)] = stored
+        return self.stored[(customer, measurement)]
+
+    def apply(self, customer, points):
+        """
+        Normalize worker tags, merge workers sharing the same normalized
+        name, and fold workers over the customer series budget (or named
+        like the "other" series) into a single "other" series.
+        Returns the new list of points.
+        """
+        kept = []
+        candidates = {}
+        for point in points:
+            if point['measurement'] not in series:
+                kept.append(point)
+                continue
+            tag = series[point['measurement']]['tag']
+            try:
+                point['tags'][tag] = self.normalize(point['tags'][tag])
+            except KeyError:
+                kept.append(point)
+                continue
+            candidates.setdefault(point['measurement'], []).append(point)
+
+        for measurement in candidates:
+            kept.extend(self.fold(customer, measurement, candidates[measurement]))
+        return kept
+
+    def ratios(self, desc, fields):
+        for f, (num, den, scale) in desc['ratios'].items():
+            try:
+                fields[f] = int(fields[num] / fields[den] * scale)
+            except (TypeError, ZeroDivisionError):
+                fields[f] = None
+
+    def merge(self, desc, into, point):
+        # A sum with an unknown part is unknown, so ratios are not skewed:
+        for f in desc['sum']:
+            a, b = into['fields'].get(f), point['fields'].get(f)
+            into['fields'][f] = None if a is None or b is None else a + b
+        self.ratios(desc, into['fields'])
+
+    def fold(self, customer, measurement, points):
+        desc = series[measurement]
+        stored = self.load(customer, measurement)
+        written = self.written.setdefault((customer, measurement), set())
+        rank = lambda p: p['fields'].get(desc['rank']) or 0
+        # Stored series first, then by rank, so active known workers keep their slot:
+        points = sorted(points, key=lambda p: (tuple(sorted(p['tags'].items())) in stored, rank(p)), reverse=True)
+        # One slot is kept for the "other" series:
+        slots = self.budget - 1
+
+        merged = {}
+        folded = []
+        for point in points:
+            name = point['tags'][desc['tag']]
+            key = tuple(sorted(point['tags'].items()))
+            if key in merged:
+                logging.warning("%s: several %s normalize to '%s', merging them", customer, measurement, name)
+                self.merge(desc, merged[key], point)
+                continue
+            if name and name != self.other and (not self.budget or key in written
+                    or (key in stored and len(written) < slots)
+                    or len(written | stored) < slots):
+                written.add(key)
+                merged[key] = point
+                continue
+            folded.append(point)
+
+        kept = list(merged.values())
+        if folded:
+            kept.append(self.fold_other(customer, measurement, folded))
+        return kept
+
+    def fold_other(self, customer, measurement, points):
+        """
+        One "other" series per customer and measurement, tagged with the
+        customer only. Each write carries the totals of the run so far.
+        """
+        desc = series[measurement]
+        if (customer, measurement) not in self.others:
+            first = points.pop(0)
+            self.others[(customer, measurement)] = {
+                "measurement": measurement,
+                "tags": {"customer": customer, desc['tag']: self.other},
+                "fields": dict((f, first['fields'].get(f)) for f in desc['sum']),
+            }
+            self.ratios(desc, self.others[(customer, measurement)]['fields'])
+            self.folded[(customer, measurement)] = self.folded.get((customer, measurement), 0) + 1
+        other = self.others[(customer, measurement)]
+        for point in points:
+            self.merge(desc, other, point)
+            self.folded[(customer, measurement)] = self.folded.get((customer, measurement), 0) + 1
+        return {
+            "measurement": measurement,
+            "tags": dict(other['tags']),
+            "fields": dict(other['fields']),
+        }
+
+    def report(self):
+        for (customer, measurement), keys in sorted(self.written.items()):
+            count = len(keys) + ((customer, measurement) in self.others)
+            logging.info("%s: %d %s series written this run, %d workers folded into '%s'", customer, count, measurement, self.folded.get((customer, measurement), 0), self.other)
+        for measurement in sorted(series):
+            count = self.sink.cardinality(measurement)
+            if count is not None:
+                logging.info("📈 %s current cardinality: %d series", measurement, count)
@@ -3,3 +3,294 @@ from mithril import __version__
 
 def test_version():
     assert __version__ == '0.1.0'
+
+
+def test_sqlite_archive(tmp_path):
+    import datetime
+    import pytest
+    from sinks import Sinks
+
+    archive = Sinks.SQLite({"path": str(tmp_path / "archive.sqlite")})
+    paid = datetime.datetime(2021, 9, 23, 7, 31, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    points = [
+        {"measurement": "workers", "tags": {"customer": "Groot", "name": "rig1"}, "fields": {"hms": 100, "Name": 1}},
+        {"measurement": "workers", "tags": {"customer": "Groot", "Name": "rig2"}, "fields": {"hms": 50}},
+        {"measurement": "payments", "time": paid, "tags": {"customer": "Groot"}, "fields": {"amount": 0.1, "time": 3}},
+        {"measurement": "payments", "time": datetime.datetime(2021, 9, 24, 7, 31), "tags": {"customer": "Groot"}, "fields": {"amount": 0.2}},
+        {"measurement": "prices", "fields": {"usd": 3000.0}},
+    ]
+    archive.write_points(points, time_precision='h')
+    archive.write_points(points, time_precision='h')
+
+    assert archive.db.execute('SELECT name, hms, name_1 FROM workers ORDER BY name').fetchall() == [("rig1", 100, 1), ("rig2", 50, None)]
+    assert archive.db.execute('SELECT _time, _day, amount FROM payments ORDER BY _time').fetchall() == [
+        ("2021-09-23T05:31:00", "2021-09-23", 0.1),
+        ("2021-09-24T07:31:00", "2021-09-24", 0.2),
+    ]
+    assert archive.db.execute('SELECT time FROM payments WHERE amount = 0.1').fetchall() == [(3,)]
+    assert archive.db.execute("SELECT name FROM sqlite_master WHERE name = 'prices'").fetchall() == []
+    assert sorted(t.get("name", t.get("Name")) for t in archive.series("workers", "Groot", 30)) == ["rig1", "rig2"]
+    assert archive.series("workers", "StarLord") == []
+    assert archive.cardinality("workers") == 2
+
+    with pytest.raises(ValueError):
+        archive.write_points([{"measurement": "workers", "tags": {"name": "rig1", "NAME": "rig1"}, "fields": {}}])
+
+
+def test_multi_sink_failures():
+    import pytest
+    from sinks import Sinks
+
+    class Broken(Sinks.Sink):
+        def write_points(self, points, time_precision=None, retention_policy=None):
+            raise IOError("down")
+
+        def close(self):
+            raise IOError("down")
+
+    class Memory(Sinks.Sink):
+        def __init__(self):
+            super().__init__()
+            self.points = []
+            self.closed = False
+
+        def write_points(self, points, time_precision=None, retention_policy=None):
+            self.points.extend(points)
+
+        def close(self):
+            self.closed = True
+
+    memory = Memory()
+    Sinks.Multi([memory, Broken()]).write_points([{"measurement": "workers"}])
+    assert memory.points == [{"measurement": "workers"}]
+
+    with pytest.raises(IOError):
+        Sinks.Multi([Broken(), memory]).write_points([])
+
+    Sinks.Multi([Broken(), memory]).close()
+    assert memory.closed
+
+
+def workers(*specs):
+    return [{
+        "measurement": "workers",
+        "tags": {"customer": "Groot", "farm": "f1", "name": name},
+        "fields": {"gpus": 1, "hms": hms, "power": power, "efficiency": None},
+    } for name, hms, power in specs]
+
+
+def by_name(points):
+    return dict((p['tags']['name'], p['fields']) for p in points if p['measurement'] == 'workers')
+
+
+def test_normalize():
+    from tags import Tags
+
+    tagger = Tags.Tagger({}, None)
+    assert tagger.normalize("Rig_01") == "rig-01"
+    assert tagger.normalize(" RIG 01 ") == "rig-01"
+    assert tagger.normalize("rig1-0") != tagger.normalize("rig-10")
+    assert tagger.normalize("Ферма-1") == "ферма-1"
+    assert tagger.normalize("矿机2") == "矿机2"
+    assert tagger.normalize("--") == ""
+
+
+class Stored:
+    """
+    Sink with series already stored for Groot.
+    """
+    def __init__(self, measurement, series):
+        self.stored = {measurement: series}
+
+    def series(self, measurement, customer, days=None):
+        return self.stored.get(measurement, [])
+
+    def cardinality(self, measurement):
+        return None
+
+
+def test_budget_overflow():
+    from tags import Tags
+
+    stored = [{"customer": "Groot", "farm": "f1", "name": n} for n in ("Small", "other")]
+    tagger = Tags.Tagger({"budget": 3}, Stored("workers", stored))
+    points = tagger.apply("Groot", workers(("Big", 300, 100), ("Medium", 200, 100), ("small", 10, 100)))
+    # "small" is already stored, so it keeps its series over the bigger "medium":
+    assert by_name(points) == {
+        "big": {"gpus": 1, "hms": 300, "power": 100, "efficiency": None},
+        "small": {"gpus": 1, "hms": 10, "power": 100, "efficiency": None},
+        "other": {"gpus": 1, "hms": 200, "power": 100, "efficiency": 2000},
+    }
+
+
+def test_budget_prefers_active_stored_series():
+    from tags import Tags
+
+    stored = [{"customer": "Groot", "farm": "f1", "name": n} for n in ("alpha", "beta", "gamma", "zeta")]
+    tagger = Tags.Tagger({"budget": 3}, Stored("workers", stored))
+    points = tagger.apply("Groot", workers(("newrig", 800, 100), ("zeta", 900, 100)))
+    # Idle stored series still hold their slots until stale_days:
+    assert by_name(points) == {
+        "zeta": {"gpus": 1, "hms": 900, "power": 100, "efficiency": None},
+        "other": {"gpus": 1, "hms": 800, "power": 100, "efficiency": 8000},
+    }
+
+
+def test_budget_counts_series():
+    from tags import Tags
+
+    tagger = Tags.Tagger({"budget": 3}, Stored("pool_workers", []))
+    points = []
+    for wallet in ("W1", "W2", "W3"):
+        points += tagger.apply("Groot", [{
+            "measurement": "pool_workers",
+            "tags": {"customer": "Groot", "wallet": wallet, "worker": name},
+            "fields": {"hashrate": 100, "avghashrate": 100},
+        } for name in ("rig1", "rig2")])
+    assert len(set(tuple(sorted(p['tags'].items())) for p in points)) == 3
+    assert points[-1] == {
+        "measurement": "pool_workers",
+        "tags": {"customer": "Groot", "worker": "other"},
+        "fields": {"hashrate": 400, "avghashrate": 400},
+    }
+
+
+def test_other_accumulates_across_calls():
+    from tags import Tags
+    from sinks import Sinks
+
+    tagger = Tags.Tagger({"budget": 2}, Sinks.Sink())
+    tagger.apply("Groot", workers(("a", 300, 100), ("b", 100, 100)))
+    points = tagger.apply("Groot", workers(("c", 50, 100), ("Other", 50, 100)))
+    assert by_name(points) == {"other": {"gpus": 3, "hms": 200, "power": 300, "efficiency": 666}}
+    # Once a folded worker has no known power, neither has the aggregate:
+    points = tagger.apply("Groot", workers(("d", 50, None)))
+    assert by_name(points) == {"other": {"gpus": 4, "hms": 250, "power": None, "efficiency": None}}
+
+
+def test_collisions_and_none_power():
+    from tags import Tags
+    from sinks import Sinks
+
+    tagger = Tags.Tagger({}, Sinks.Sink())
+    points = tagger.apply("Groot", workers(("Rig-1", 100, None), ("rig 1", 50, None), ("rig2", 0, 100)))
+    assert by_name(points) == {
+        "rig-1": {"gpus": 2, "hms": 150, "power": None, "efficiency": None},
+        "rig2": {"gpus": 1, "hms": 0, "power": 100, "efficiency": None},
+    }
+
+
+def test_parse_series():
+    from sinks import Sinks
+
+    assert Sinks.parse_series("workers,customer=Groot,farm=f\\,1,name=rig\\ 1") == {"customer": "Groot", "farm": "f,1", "name": "rig 1"}
+
+
+def fixture(name):
+    import json
+    import os
+
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", name + ".json")) as f:
+        return json.load(f)
+
+
+def replay(poolclass, responses):
+    """
+    Pool answering each uri from responses (HTTP error when missing), with the list of uris queried.
+    """
+    import json
+    from sinks import Sinks
+    from tags import Tags
+
+    pool = poolclass(Sinks.Sink(), Tags.Tagger({}, Sinks.Sink()), poolclass.__name__.lower(), "Groot", "W", "eth")
+    calls = []
+
+    def query(uri):
+        calls.append(uri)
+        if uri not in responses:
+            return False
+        return json.dumps(responses[uri]).encode()
+
+    pool.query = query
+    pool.prices = {"usd": 3000.0, "eur": 2500.0}
+    pool.load()
+    pool.account()
+    pool.hashrate()
+    return pool, calls
+
+
+NANOPOOL_POINTS = [
+    {"measurement": "account", "fields": {"balance": 0.12345678, "payout": 0.2}},
+    {"measurement": "pool_workers", "tags": {"worker": "Rig-01"}, "fields": {"hashrate": 150, "avghashrate": 140}},
+    {"measurement": "pool_workers", "tags": {"worker": "rig02"}, "fields": {"hashrate": 100, "avghashrate": 100}},
+    {"measurement": "hashrate", "fields": {"reported": 260, "calculated": 250, "avg": 240}},
+]
+
+
+def test_nanopool_load_account():
+    from pool import Pools
+
+    pool, calls = replay(Pools.Nanopool, {"/load_account/W": fixture("nanopool_load_account")})
+    assert calls == ["/load_account/W"]
+    assert pool.points == NANOPOOL_POINTS
+    assert pool.workers == {"rig-01": 150, "rig02": 100}
+
+
+def test_nanopool_fallback_per_field():
+    from pool import Pools
+
+    load_account = fixture("nanopool_load_account")
+    del load_account["data"]["userParams"]["reportedHashrate"]
+    pool, calls = replay(Pools.Nanopool, {
+        "/load_account/W": load_account,
+        "/reportedhashrate/W": fixture("nanopool_reportedhashrate"),
+    })
+    assert calls == ["/load_account/W", "/reportedhashrate/W"]
+    assert pool.points == NANOPOOL_POINTS
+
+
+def test_nanopool_fallback_without_load_account():
+    from pool import Pools
+
+    pool, calls = replay(Pools.Nanopool, {
+        "/user/W": fixture("nanopool_user"),
+        "/usersettings/W": fixture("nanopool_usersettings"),
+        "/reportedhashrate/W": fixture("nanopool_reportedhashrate"),
+    })
+    assert calls == ["/load_account/W", "/user/W", "/usersettings/W", "/reportedhashrate/W"]
+    assert pool.points == NANOPOOL_POINTS
+
+
+ETHERMINE_POINTS = [
+    {"measurement": "account", "fields": {"balance": 0.123, "payout": 0.1}},
+    {"measurement": "pool_workers", "tags": {"worker": "rig-01"}, "fields": {"hashrate": 160, "avghashrate": 150}},
+    {"measurement": "pool_workers", "tags": {"worker": "a10pro"}, "fields": {"hashrate": 0, "avghashrate": 500}},
+    {"measurement": "hashrate", "fields": {"reported": 160, "calculated": 650, "avg": 640}},
+]
+
+
+def test_ethermine_dashboard():
+    from pool import Pools
+
+    pool, calls = replay(Pools.Ethermine, {
+        "/miner/W/currentStats": fixture("ethermine_currentStats"),
+        "/miner/W/dashboard": fixture("ethermine_dashboard"),
+    })
+    assert calls == ["/miner/W/currentStats", "/miner/W/dashboard"]
+    assert pool.points == ETHERMINE_POINTS
+    assert pool.workers == {"rig-01": 160, "a10pro": 500}
+
+
+def test_ethermine_fallback_per_field():
+    from pool import Pools
+
+    dashboard = fixture("ethermine_dashboard")
+    dashboard["data"]["settings"] = None
+    pool, calls = replay(Pools.Ethermine, {
+        "/miner/W/currentStats": fixture("ethermine_currentStats"),
+        "/miner/W/dashboard": dashboard,
+        "/miner/W/settings": fixture("ethermine_settings"),
+        "/miner/W/workers": fixture("ethermine_workers"),
+    })
+    assert calls == ["/miner/W/currentStats", "/miner/W/dashboard", "/miner/W/settings"]
+    assert pool.points == ETHERMINE_POINTS